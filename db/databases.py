@@ -8,15 +8,21 @@ def get_database(conn):
 
 
 def drop_database(database_oid, conn):
-    cursor = conn.cursor()
+    """
+    Use the given connection to drop the database with the given oid.
+
+    This takes two round trips: one to get the DROP query from msar, one to run it. They can't be
+    merged into one msar function, since Postgres refuses to run DROP DATABASE from within a
+    function (or DO block), as well as inside a transaction block.
+    """
     conn.autocommit = True
-    drop_database_query = db_conn.exec_msar_func(
-        conn,
-        'drop_database_query',
-        database_oid
-    ).fetchone()[0]
-    cursor.execute(sql.SQL(drop_database_query))
-    cursor.close()
+    with conn.cursor() as cursor:
+        drop_database_query = db_conn.exec_msar_func(
+            cursor,
+            'drop_database_query',
+            database_oid
+        ).fetchone()[0]
+        cursor.execute(sql.SQL(drop_database_query))
     conn.autocommit = False
 
 
@@ -1,16 +1,35 @@
 from abc import ABC, abstractmethod
-from copy import deepcopy
+import collections
+import functools
 import itertools
+import types
 
 import sqlalchemy
 from sqlalchemy import select
 
+from db.deprecated.functions.base import ColumnName
 from db.deprecated.functions.operations.apply import apply_db_function_by_id, apply_db_function_spec_as_filter
+from db.deprecated.functions.operations.deserialize import get_db_function_from_ma_function_spec, get_raw_spec_components
 from db.deprecated.functions.packed import DistinctArrayAgg
 from db.deprecated import sort as rec_sort
+from db.deprecated import columns as col_utils
 
 
-class UniqueConstraintMapping:
+# Shared by all transforms that don't map output aliases to input aliases, to not allocate a new
+# empty dict on each access. Read-only, since it's shared.
+_EMPTY_MAP = types.MappingProxyType({})
+
+_SELECTABLE = sqlalchemy.sql.expression.Selectable
+_EXECUTABLE = sqlalchemy.sql.expression.Executable
+
+# Maps relation types to their (is Selectable, is Executable) flags. There are only a few relation
+# types (Table, CTE, Select, etc.), so this fills up right away.
+_relation_type_flags_cache = {}
+
+
+class UniqueConstraintMapping(
+    collections.namedtuple('UniqueConstraintMapping', ['input_alias', 'output_alias'])
+):
     """
     A unique constraint mapping describes how a transform in a query maps a given input alias to an
     output alias, in the context of unique constraints.
@@ -31,11 +50,10 @@ class UniqueConstraintMapping:
         - whether a given alias is linked to a given initial column (initial-column-linked);
         - whether a given initial-column-linked alias is unique-constrained when that initial column
         is unique-constrained.
-    """
 
-    def __init__(self, input_alias, output_alias):
-        self.input_alias = input_alias
-        self.output_alias = output_alias
+    Transforms create one of these per alias, so it's a namedtuple (and has no instance `__dict__`).
+    """
+    __slots__ = ()
 
 
 class Transform(ABC):
@@ -56,16 +74,70 @@ class Transform(ABC):
             )
         self.spec = spec
 
-    @abstractmethod
     def apply_to_relation(self, relation):
+        """
+        Applies this transform to `relation`, returning a non-executable (wrapping the resulting
+        SELECT in a CTE, if there is one).
+        """
+        return _to_non_executable(self.apply_to_relation_raw(relation))
+
+    @abstractmethod
+    def apply_to_relation_raw(self, relation):
+        """
+        Like `apply_to_relation`, but returns the resulting SELECT (an Executable) as is, without
+        wrapping it. May return `relation` itself, if the transform doesn't change it.
+        """
+        return None
+
+    def fuse_with(self, next_transform):
+        """
+        Returns a single transform equivalent to applying this transform and then
+        `next_transform`, or None if they can't be fused.
+
+        A fused transform produces a single SELECT (and a single CTE), where the two transforms
+        would have produced one each.
+        """
+        return None
+
+    def referenced_aliases(self):
+        """
+        Returns the set of input aliases this transform reads, or None if that's not known.
+        """
+        return None
+
+    def get_input_aliases_for_pushed_down_filter(self, output_aliases):
+        """
+        Returns a mapping of `output_aliases` to input aliases, if a Filter that references only
+        `output_aliases` can be moved from after this transform to before it (with the aliases
+        renamed per the mapping) without changing the result. Otherwise, returns None.
+
+        By default filters can't be moved before a transform.
+        """
         return None
 
     def __eq__(self, other):
+        """
+        Transforms are equal when they're of the same type and have equal specs. Other instance
+        state is usually derived from the spec (e.g. precomputed lookups); subclasses whose
+        instances carry state that changes the generated SQL include it by extending this and
+        `__hash__`.
+        """
         return (
             type(self) is type(other)
-            and self.__dict__ == other.__dict__
+            and self.spec == other.spec
         )
 
+    def __hash__(self):
+        """
+        Lets transforms be used in sets and as cache keys. Presumes that specs aren't mutated, like
+        the rest of this module does.
+        """
+        try:
+            return hash((type(self), _get_hashable_spec(self.spec)))
+        except TypeError:
+            # The spec holds something unhashable; equal transforms still have the same type.
+            return hash(type(self))
+
     @property
     def map_of_output_alias_to_input_alias(self):
         """
@@ -80,16 +152,18 @@ class Transform(ABC):
         but that's not true at least in the case of multi-column aggregation functions [0].
 
         [0] http://www.postgresonline.com/journal/archives/105-How-to-create-multi-column-aggregates.html
+
+        The returned mapping is read-only.
         """
-        return dict()
+        return _EMPTY_MAP
 
     def get_output_aliases(self, input_aliases):
         uc_mappings = self.get_unique_constraint_mappings(input_aliases)
-        return [
+        return tuple(
             uc_mapping.output_alias
             for uc_mapping
             in uc_mappings
-        ]
+        )
 
     def get_unique_constraint_mappings(self, input_aliases):
         """
@@ -106,22 +180,77 @@ class Transform(ABC):
         ]
 
 
+def _get_hashable_spec(spec):
+    """
+    Returns a hashable version of `spec`, which is equal for specs that compare equal, so that
+    hashing it is consistent with comparing specs via `==` (e.g. 1, 1.0 and True hash the same,
+    and dict ordering doesn't matter).
+    """
+    if isinstance(spec, dict):
+        return frozenset(
+            (key, _get_hashable_spec(value))
+            for key, value
+            in spec.items()
+        )
+    elif isinstance(spec, (list, tuple)):
+        return tuple(_get_hashable_spec(item) for item in spec)
+    elif isinstance(spec, (set, frozenset)):
+        return frozenset(_get_hashable_spec(item) for item in spec)
+    else:
+        return spec
+
+
 class Filter(Transform):
+    """
+    Literals in the filter spec (`{"literal": [...]}`) become bound parameters, not inline SQL, so
+    filters that only differ in their literals produce statements with the same structure, and
+    equal cache keys.
+    """
     type = "filter"
 
-    def apply_to_relation(self, relation):
+    def apply_to_relation_raw(self, relation):
         filter = self.spec
         enforce_relation_type_expectations(relation)
         executable = _to_executable(relation)
         if filter is not None:
             executable = apply_db_function_spec_as_filter(executable, filter)
-        return _to_non_executable(executable)
+        return executable
+
+    def referenced_aliases(self):
+        if self.spec is None:
+            return set()
+        return get_db_function_from_ma_function_spec(self.spec).referenced_columns
+
+    def get_new_with_aliases_renamed(self, map_of_old_to_new_alias):
+        if self.spec is None:
+            return self
+        new_spec = _rename_column_names_in_db_function_spec(self.spec, map_of_old_to_new_alias)
+        return Filter(new_spec)
+
+
+def _rename_column_names_in_db_function_spec(db_function_spec, map_of_old_to_new_name):
+    db_function_subclass_id, raw_parameters = get_raw_spec_components(db_function_spec)
+    if db_function_subclass_id == ColumnName.id:
+        new_parameters = [
+            map_of_old_to_new_name.get(column_name, column_name)
+            for column_name
+            in raw_parameters
+        ]
+    else:
+        new_parameters = [
+            _rename_column_names_in_db_function_spec(raw_parameter, map_of_old_to_new_name)
+            if isinstance(raw_parameter, dict)
+            else raw_parameter
+            for raw_parameter
+            in raw_parameters
+        ]
+    return {db_function_subclass_id: new_parameters}
 
 
 class Order(Transform):
     type = "order"
 
-    def apply_to_relation(self, relation):
+    def apply_to_relation_raw(self, relation):
         order_by = self.spec
         enforce_relation_type_expectations(relation)
         order_by = rec_sort.make_order_by_deterministic(relation, order_by)
@@ -129,27 +258,93 @@ class Order(Transform):
             executable = rec_sort.apply_relation_sorting(relation, order_by)
         else:
             executable = _to_executable(relation)
-        return _to_non_executable(executable)
+        return executable
 
 
 class Limit(Transform):
     type = "limit"
 
-    def apply_to_relation(self, relation):
+    def apply_to_relation_raw(self, relation):
         limit = self.spec
         executable = _to_executable(relation)
         executable = executable.limit(limit)
-        return _to_non_executable(executable)
+        return executable
+
+    def fuse_with(self, next_transform):
+        return _fuse_limits_and_offsets(self, next_transform)
 
 
 class Offset(Transform):
     type = "offset"
 
-    def apply_to_relation(self, relation):
+    def apply_to_relation_raw(self, relation):
         offset = self.spec
         executable = _to_executable(relation)
         executable = executable.offset(offset)
-        return _to_non_executable(executable)
+        return executable
+
+    def fuse_with(self, next_transform):
+        return _fuse_limits_and_offsets(self, next_transform)
+
+
+class _LimitOffset(Transform):
+    """
+    Applies an offset and then a limit in a single SELECT. Only produced by fusing Limit and
+    Offset transforms (see `Transform.fuse_with`); not meant to be specified by users.
+
+    "spec": {
+        "offset": 10,  # None for no offset
+        "limit": 5,  # None for no limit
+    }
+    """
+    type = "_limit_offset"
+
+    def apply_to_relation_raw(self, relation):
+        executable = _to_executable(relation)
+        # Fusing only Limits yields an offset of 0; don't emit an OFFSET nobody asked for (which, in
+        # Postgres, would also keep the planner from flattening it into the enclosing query).
+        executable = executable.offset(self.spec['offset'] or None).limit(self.spec['limit'])
+        return executable
+
+    def fuse_with(self, next_transform):
+        return _fuse_limits_and_offsets(self, next_transform)
+
+
+def _fuse_limits_and_offsets(transform, next_transform):
+    """
+    Fuses a Limit, Offset or _LimitOffset with a following one of those.
+
+    Each of these selects a window of rows: skip `offset` rows, then take at most `limit` rows.
+    Note that order matters: Limit(5) then Offset(2) yields rows 3 to 5 (offset 2, limit 3),
+    while Offset(2) then Limit(5) yields rows 3 to 7 (offset 2, limit 5).
+    """
+    next_window = _get_limit_offset_window(next_transform)
+    if next_window is None:
+        return None
+    offset, limit = _get_limit_offset_window(transform)
+    next_offset, next_limit = next_window
+    fused_offset = offset + next_offset
+    if limit is None:
+        fused_limit = next_limit
+    else:
+        remaining_rows = max(limit - next_offset, 0)
+        fused_limit = remaining_rows if next_limit is None else min(remaining_rows, next_limit)
+    return _LimitOffset(dict(offset=fused_offset, limit=fused_limit))
+
+
+def _get_limit_offset_window(transform):
+    """
+    Returns an (offset, limit) tuple for Limit, Offset and _LimitOffset transforms, or None for
+    other transforms. An offset of None is normalized to 0; a limit of None means no limit.
+    """
+    if isinstance(transform, Limit):
+        return 0, transform.spec
+    elif isinstance(transform, Offset):
+        return transform.spec or 0, None
+    elif isinstance(transform, _LimitOffset):
+        return transform.spec['offset'] or 0, transform.spec['limit']
+    else:
+        return None
 
 
 class Summarize(Transform):
@@ -183,7 +378,22 @@ class Summarize(Transform):
     default_group_output_alias_suffix = "_grouped"
     default_agg_output_alias_suffix = "_agged"
 
-    @property
+    def __init__(self, spec, group_by_prefix=()):
+        """
+        `group_by_prefix` holds grouping output aliases to put first in the GROUP BY, in that
+        order; see `_get_group_by_expressions`. It's not part of the spec, since it doesn't change
+        the result, but it does change the generated SQL.
+        """
+        super().__init__(spec)
+        self._group_by_prefix = tuple(group_by_prefix)
+
+    def __eq__(self, other):
+        return super().__eq__(other) and self._group_by_prefix == other._group_by_prefix
+
+    def __hash__(self):
+        return hash((super().__hash__(), self._group_by_prefix))
+
+    @functools.cached_property
     def map_of_output_alias_to_input_alias(self):
         m = dict()
         grouping_expressions = self.spec['grouping_expressions']
@@ -193,15 +403,21 @@ class Summarize(Transform):
             expr_output_alias = expression.get('output_alias', None)
             expr_input_alias = expression.get('input_alias', None)
             m[expr_output_alias] = expr_input_alias
-        return m
+        # Computed once per instance and shared between callers; hence read-only.
+        return types.MappingProxyType(m)
 
-    def apply_to_relation(self, relation):
+    def apply_to_relation_raw(self, relation):
+        # A snapshot of the relation's columns, for the lookups below. Building it costs a pass over
+        # every column, and each dict lookup is only a little cheaper than a ColumnCollection one,
+        # so it only pays off when the summarization references most of the relation's columns;
+        # for a few columns of a wide relation it's slower than looking them up directly.
+        columns_by_key = dict(relation.columns.items())
 
         def _get_grouping_column(col_spec):
             preproc_db_function_subclass_id = col_spec.get('preproc')
             input_alias = col_spec['input_alias']
             output_alias = col_spec['output_alias']
-            sa_expression = relation.columns[input_alias]
+            sa_expression = columns_by_key[input_alias]
             if preproc_db_function_subclass_id is not None:
                 sa_expression = apply_db_function_by_id(
                     preproc_db_function_subclass_id,
@@ -210,11 +426,11 @@ class Summarize(Transform):
             sa_expression = sa_expression.label(output_alias)
             return sa_expression
 
-        def _get_aggregation_column(relation, col_spec):
+        def _get_aggregation_column(col_spec):
             input_alias = col_spec['input_alias']
             output_alias = col_spec['output_alias']
             agg_db_function_subclass_id = col_spec['function']
-            column_to_aggregate = relation.columns[input_alias]
+            column_to_aggregate = columns_by_key[input_alias]
             sa_expression = apply_db_function_by_id(
                 agg_db_function_subclass_id,
                 [column_to_aggregate],
@@ -227,36 +443,127 @@ class Summarize(Transform):
             in self._grouping_col_specs
         ]
         aggregation_expressions = [
-            _get_aggregation_column(relation, col_spec)
+            _get_aggregation_column(col_spec)
             for col_spec
             in self.aggregation_col_specs
         ]
+        group_by_expressions = self._get_group_by_expressions(relation, grouping_expressions)
         executable = (
             select(*grouping_expressions, *aggregation_expressions)
-            .group_by(*grouping_expressions)
+            .group_by(*group_by_expressions)
+        )
+        return executable
+
+    def _get_group_by_expressions(self, relation, grouping_expressions):
+        """
+        Returns the grouping expressions in the order in which they should be put in the GROUP BY
+        clause. Grouping expressions stay in spec order in the SELECT list.
+
+        The order of GROUP BY expressions doesn't change the result, but it does matter to how
+        Postgres groups by sorting. So, first come the grouping output aliases that the following
+        Order transform sorts by, if any (see `get_new_with_group_by_ordered_like`), so that
+        grouping can produce rows already in (or close to) the requested order. Next come plain
+        (not preprocessed) primary key columns of the relation: comparing rows on a (nearly)
+        unique key first resolves most comparisons without looking at the other keys.
+
+        Note that we don't go as far as dropping columns that are functionally dependent on the
+        primary key from the GROUP BY, like Postgres does for tables: the relation is a CTE, so
+        Postgres can't see that dependency and would reject the ungrouped columns.
+        """
+        pk_cols = col_utils.get_primary_key_column_collection_from_relation(relation)
+        pk_keys = set() if pk_cols is None else set(
+            col.key for col in set(pk_cols).intersection(relation.columns)
+        )
+        group_by_prefix = self._group_by_prefix
+
+        def _get_group_by_rank(col_spec):
+            output_alias = col_spec['output_alias']
+            if output_alias in group_by_prefix:
+                return group_by_prefix.index(output_alias)
+            is_pk = col_spec.get('preproc') is None and col_spec['input_alias'] in pk_keys
+            return len(group_by_prefix) + (0 if is_pk else 1)
+
+        ranked_grouping_expressions = zip(
+            (_get_group_by_rank(col_spec) for col_spec in self._grouping_col_specs),
+            grouping_expressions,
+        )
+        return [
+            grouping_expression
+            for _, grouping_expression
+            in sorted(ranked_grouping_expressions, key=lambda ranked: ranked[0])
+        ]
+
+    def get_new_with_group_by_ordered_like(self, order):
+        """
+        Returns new summarization whose GROUP BY starts with the grouping output aliases that
+        `order` (an Order transform applied right after this one) sorts by first, in the same order.
+        """
+        grouping_output_aliases = self.grouping_output_aliases
+        sorted_grouping_output_aliases = [
+            sort_spec['field']
+            for sort_spec
+            in itertools.takewhile(
+                lambda sort_spec: (
+                    isinstance(sort_spec, dict)
+                    and sort_spec.get('field') in grouping_output_aliases
+                ),
+                order.spec or [],
+            )
+        ]
+        return type(self)(
+            self.spec,
+            group_by_prefix=dict.fromkeys(sorted_grouping_output_aliases),
         )
-        return _to_non_executable(executable)
+
+    def get_input_aliases_for_pushed_down_filter(self, output_aliases):
+        """
+        A filter that only references grouping output aliases that aren't preprocessed keeps or
+        drops whole groups, so it can just as well be applied to the rows before they're grouped,
+        which means fewer rows to aggregate.
+
+        That's not the case for a filter that references no columns at all (e.g. one comparing two
+        literals), or for a summarization without grouping expressions: a global aggregate yields
+        a row even when there are no rows to aggregate, so filtering before it would turn no rows
+        into one.
+        """
+        if not output_aliases or not self._grouping_col_specs:
+            return None
+        map_of_unchanged_output_alias_to_input_alias = {
+            col_spec['output_alias']: col_spec['input_alias']
+            for col_spec
+            in self._grouping_col_specs
+            if col_spec.get('preproc') is None
+        }
+        if not set(output_aliases).issubset(map_of_unchanged_output_alias_to_input_alias):
+            return None
+        return {
+            output_alias: map_of_unchanged_output_alias_to_input_alias[output_alias]
+            for output_alias
+            in output_aliases
+        }
 
     def get_unique_constraint_mappings(self, _):
-        mappings_that_carry_uniqueness_over = [
+        mappings_that_carry_uniqueness_over = (
             UniqueConstraintMapping(
                 input_alias=col_spec['input_alias'],
                 output_alias=col_spec['output_alias'],
             )
             for col_spec
             in self._grouping_col_specs
-        ]
-        mappings_that_dont_carry_uniqueness_over = [
+        )
+        mappings_that_dont_carry_uniqueness_over = (
             UniqueConstraintMapping(
                 input_alias=None,
                 output_alias=col_spec['output_alias'],
             )
             for col_spec
             in self.aggregation_col_specs
-        ]
-        return (
-            mappings_that_carry_uniqueness_over
-            + mappings_that_dont_carry_uniqueness_over
+        )
+        return list(
+            itertools.chain(
+                mappings_that_carry_uniqueness_over,
+                mappings_that_dont_carry_uniqueness_over,
+            )
         )
 
     def get_new_with_aliases_added_to_group_by(self, aliases):
@@ -295,45 +602,49 @@ class Summarize(Transform):
     def base_grouping_column(self):
         return self.spec['base_grouping_column']
 
-    @property
+    # The col specs and aliases below are read repeatedly while planning a query, and specs aren't
+    # mutated, so each is derived once per instance (on first access, so that malformed col specs
+    # only raise when used, like before).
+
+    @functools.cached_property
     def aggregation_output_aliases(self):
-        return [
+        return tuple(
             col_spec['output_alias']
             for col_spec
             in self.aggregation_col_specs
-        ]
+        )
 
-    @property
+    @functools.cached_property
     def grouping_output_aliases(self):
-        return [
+        return tuple(
             col_spec['output_alias']
             for col_spec
             in self._grouping_col_specs
-        ]
+        )
 
-    @property
+    @functools.cached_property
     def grouping_input_aliases(self):
-        return [
+        return tuple(
             col_spec['input_alias']
             for col_spec
             in self._grouping_col_specs
-        ]
+        )
 
-    @property
+    @functools.cached_property
     def aggregation_input_aliases(self):
-        return [
+        return tuple(
             col_spec['input_alias']
             for col_spec
             in self.aggregation_col_specs
-        ]
+        )
 
-    @property
+    @functools.cached_property
     def _grouping_col_specs(self):
-        return self.spec.get("grouping_expressions", [])
+        return tuple(self.spec.get("grouping_expressions", []))
 
-    @property
+    @functools.cached_property
     def aggregation_col_specs(self):
-        return self.spec.get("aggregation_expressions", [])
+        return tuple(self.spec.get("aggregation_expressions", []))
 
 
 def _add_aliases_to_summarization_expr_field(
@@ -344,8 +655,10 @@ def _add_aliases_to_summarization_expr_field(
 
     This function will apply `get_col_spec_from_alias` to each column alias in `aliases`,
     and add the results to the chosen `spec_field` in a copy of `summarization`, returning the copy.
+
+    Only the top level of the spec is copied: expression specs are never mutated, so the copy can
+    share them with the original.
     """
-    summarization = deepcopy(summarization)
     expressions_to_add = [
         get_col_spec_from_alias(alias)
         for alias
@@ -357,8 +670,10 @@ def _add_aliases_to_summarization_expr_field(
             existing_expressions, expressions_to_add
         )
     )
-    summarization.spec[spec_field] = new_expressions
-    return summarization
+    new_spec = dict(summarization.spec)
+    new_spec[spec_field] = new_expressions
+    # Adding expressions doesn't remove any grouping aliases, so the GROUP BY prefix still applies.
+    return type(summarization)(new_spec, group_by_prefix=summarization._group_by_prefix)
 
 
 class HideColumns(Transform):
@@ -370,16 +685,37 @@ class HideColumns(Transform):
     """
     type = "hide"
 
-    def apply_to_relation(self, relation):
-        input_aliases = [
-            col.name
+    def __init__(self, spec):
+        super().__init__(spec)
+        # Membership is checked once per input alias, so we want constant-time lookups.
+        self._columns_to_hide = frozenset(spec)
+
+    def apply_to_relation_raw(self, relation):
+        if not self._columns_to_hide:
+            return relation
+        columns_to_select = [
+            col
             for col
             in relation.c
+            if col.name not in self._columns_to_hide
         ]
-        columns_to_select = self.get_columns_to_select(input_aliases)
-        select_transform = SelectSubsetOfColumns(columns_to_select)
-        relation = select_transform.apply_to_relation(relation)
-        return relation
+        # Like SelectSubsetOfColumns, selecting no columns leaves the relation as is.
+        if not columns_to_select or len(columns_to_select) == len(relation.c):
+            return relation
+        return select(*columns_to_select).select_from(relation)
+
+    def get_input_aliases_for_pushed_down_filter(self, output_aliases):
+        """
+        Hiding columns doesn't affect rows, so a filter on columns that aren't hidden can be
+        applied before hiding.
+        """
+        if not self._columns_to_hide.isdisjoint(output_aliases):
+            return None
+        return {
+            output_alias: output_alias
+            for output_alias
+            in output_aliases
+        }
 
     def get_unique_constraint_mappings(self, input_aliases):
         columns_to_select = self.get_columns_to_select(input_aliases)
@@ -400,35 +736,40 @@ class HideColumns(Transform):
             if column not in self._columns_to_hide
         ]
 
-    @property
-    def _columns_to_hide(self):
-        return self.spec
-
 
 class SelectSubsetOfColumns(Transform):
     type = "select"
 
-    def apply_to_relation(self, relation):
+    def apply_to_relation_raw(self, relation):
+        if self._selects_all_columns_of(relation):
+            # Selecting every column, in order, would just wrap the relation in another layer.
+            return relation
         sa_columns_to_select = self._get_sa_columns_to_select(relation)
         if sa_columns_to_select:
             executable = select(*sa_columns_to_select).select_from(relation)
-            return _to_non_executable(executable)
+            return executable
         else:
             return relation
 
     def get_unique_constraint_mappings(self, _):
         # We presume that when we're looking at uc mappings, the raw spec will always be string
         # names.
-        column_names_to_select = self._raw_columns_to_select
         return [
             UniqueConstraintMapping(
-                column_names_to_select,
-                column_names_to_select,
+                column_name,
+                column_name,
             )
-            for column_names_to_select
-            in column_names_to_select
+            for column_name
+            in self._raw_columns_to_select
         ]
 
+    def _selects_all_columns_of(self, relation):
+        raw_columns_to_select = self._raw_columns_to_select
+        return (
+            all(isinstance(raw_col, str) for raw_col in raw_columns_to_select)
+            and tuple(raw_columns_to_select) == tuple(relation.columns.keys())
+        )
+
     def _get_sa_columns_to_select(self, relation):
         return tuple(
             _make_sure_sa_col_expr(raw_col, relation)
@@ -464,8 +805,9 @@ def _to_executable(relation):
     """
     Executables are a subset of Selectables.
     """
-    assert isinstance(relation, sqlalchemy.sql.expression.Selectable)
-    if isinstance(relation, sqlalchemy.sql.expression.Executable):
+    is_selectable, is_executable = _get_relation_type_flags(relation)
+    assert is_selectable
+    if is_executable:
         return relation
     else:
         return select(relation)
@@ -476,8 +818,9 @@ def _to_non_executable(relation):
     Non-executables are Selectables that are not Executables. Non-executables are more portable
     than Executables.
     """
-    assert isinstance(relation, sqlalchemy.sql.expression.Selectable)
-    if isinstance(relation, sqlalchemy.sql.expression.Executable):
+    is_selectable, is_executable = _get_relation_type_flags(relation)
+    assert is_selectable
+    if is_executable:
         return relation.cte()
     else:
         return relation
@@ -490,7 +833,26 @@ def enforce_relation_type_expectations(relation):
     It's not the other way around, because if you pass around Executables, composition sometimes
     works differently.
 
-    This method is a development tool mostly, probably shouldn't exist in actual production.
+    This method is a development tool mostly, probably shouldn't exist in actual production; it's
+    a no-op when Python runs with optimizations on (`python -O`).
     """
-    assert isinstance(relation, sqlalchemy.sql.expression.Selectable)
-    assert not isinstance(relation, sqlalchemy.sql.expression.Executable)
+    if __debug__:
+        is_selectable, is_executable = _get_relation_type_flags(relation)
+        assert is_selectable
+        assert not is_executable
+
+
+def _get_relation_type_flags(relation):
+    """
+    Returns whether the relation is a Selectable and whether it's an Executable, looked up by the
+    relation's type, since these checks are done at least once per transform applied.
+    """
+    relation_type = type(relation)
+    flags = _relation_type_flags_cache.get(relation_type)
+    if flags is None:
+        flags = (
+            issubclass(relation_type, _SELECTABLE),
+            issubclass(relation_type, _EXECUTABLE),
+        )
+        _relation_type_flags_cache[relation_type] = flags
+    return flags
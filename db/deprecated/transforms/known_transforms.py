@@ -15,10 +15,15 @@ from db.deprecated.transforms.base import Transform
 
 
 def _is_concrete_transform_subclass(member):
+    """
+    Underscore-prefixed Transform subclasses are internal (e.g. produced by fusing transforms),
+    so they're not considered known transforms.
+    """
     return (
         inspect.isclass(member)
         and issubclass(member, Transform)
         and not inspect.isabstract(member)
+        and not member.__name__.startswith('_')
     )
 
 
@@ -4,11 +4,69 @@ from db.deprecated.transforms import base
 
 def apply_transformations(relation, transformations):
     enforce_relation_type_expectations(relation)
+    transformations = _push_down_filters(transformations)
+    transformations = _order_groupings_like_following_orders(transformations)
+    transformations = _fuse_transformations(transformations)
     for transform in transformations:
         relation = _apply_transform(relation, transform)
     return relation
 
 
+def _push_down_filters(transformations):
+    """
+    Moves each Filter before the transforms preceding it, for as long as that doesn't change the
+    result (see `Transform.get_input_aliases_for_pushed_down_filter`), so that fewer rows flow
+    through the rest of the pipeline. Most importantly, this filters rows before, instead of after,
+    a Summarize, when the filter only references its grouping columns.
+    """
+    transformations = list(transformations)
+    for ix, transform in enumerate(transformations):
+        if not isinstance(transform, base.Filter):
+            continue
+        filter_ix = ix
+        while filter_ix > 0:
+            previous_transform = transformations[filter_ix - 1]
+            map_of_output_alias_to_input_alias = \
+                previous_transform.get_input_aliases_for_pushed_down_filter(
+                    transform.referenced_aliases()
+                )
+            if map_of_output_alias_to_input_alias is None:
+                break
+            transform = transform.get_new_with_aliases_renamed(map_of_output_alias_to_input_alias)
+            transformations[filter_ix - 1] = transform
+            transformations[filter_ix] = previous_transform
+            filter_ix -= 1
+    return transformations
+
+
+def _order_groupings_like_following_orders(transformations):
+    """
+    Makes each Summarize that's directly followed by an Order put the columns it's sorted by first
+    in its GROUP BY, so that Postgres can group and sort in one go.
+    """
+    transformations = list(transformations)
+    for ix, (transform, next_transform) in enumerate(zip(transformations, transformations[1:])):
+        if isinstance(transform, base.Summarize) and isinstance(next_transform, base.Order):
+            transformations[ix] = transform.get_new_with_group_by_ordered_like(next_transform)
+    return transformations
+
+
+def _fuse_transformations(transformations):
+    """
+    Merges runs of adjacent transforms that can be applied as a single SELECT (see
+    `Transform.fuse_with`), so that each run produces one CTE instead of one per transform.
+    """
+    fused_transformations = []
+    for transform in transformations:
+        if fused_transformations:
+            fused_transform = fused_transformations[-1].fuse_with(transform)
+            if fused_transform is not None:
+                fused_transformations[-1] = fused_transform
+                continue
+        fused_transformations.append(transform)
+    return fused_transformations
+
+
 def _apply_transform(relation, transform):
     assert isinstance(transform, Transform)
     relation = transform.apply_to_relation(relation)
@@ -10,3 +10,41 @@ def test_basic_transforms(shallow_link_dbquery):
     dbq.transformations = transformations
     records = dbq.get_records()
     assert records == [(2, 'uni1')]
+
+
+def test_limit_then_offset_transforms(shallow_link_dbquery):
+    dbq = shallow_link_dbquery
+    transformations = [
+        transforms_base.Order([{'field': 'id', 'direction': 'asc'}]),
+        transforms_base.Limit(2),
+        transforms_base.Offset(1),
+    ]
+    dbq.transformations = transformations
+    records = dbq.get_records()
+    assert records == [(2, 'uni1')]
+
+
+def test_filter_after_summarize(shallow_link_dbquery):
+    dbq = shallow_link_dbquery
+    transformations = [
+        transforms_base.Summarize(
+            dict(
+                base_grouping_column='institution_name',
+                grouping_expressions=[
+                    dict(input_alias='institution_name', output_alias='institution_name_grouped'),
+                ],
+                aggregation_expressions=[
+                    dict(input_alias='id', output_alias='id_agged', function='count'),
+                ],
+            )
+        ),
+        transforms_base.Filter(
+            {'equal': [
+                {'column_name': ['institution_name_grouped']},
+                {'literal': ['uni1']},
+            ]}
+        ),
+    ]
+    dbq.transformations = transformations
+    records = dbq.get_records()
+    assert records == [('uni1', 2)]
@@ -0,0 +1,18 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, Text, select
+
+
+@pytest.fixture
+def books_table():
+    return Table(
+        'books',
+        MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('title', Text),
+        Column('author', Text),
+    )
+
+
+@pytest.fixture
+def books_relation(books_table):
+    return select(books_table).cte()
@@ -0,0 +1,112 @@
+import pytest
+
+from db.deprecated.transforms.base import (
+    Filter, HideColumns, Limit, Offset, Order, Summarize, _LimitOffset,
+)
+from db.deprecated.transforms.operations.apply import _fuse_transformations, _push_down_filters
+
+
+@pytest.mark.parametrize(
+    'transformations,expected_fused_transformations',
+    [
+        [
+            [Offset(2), Limit(5)],
+            [_LimitOffset(dict(offset=2, limit=5))],
+        ],
+        [
+            [Limit(5), Offset(2)],
+            [_LimitOffset(dict(offset=2, limit=3))],
+        ],
+        [
+            [Limit(2), Offset(5)],
+            [_LimitOffset(dict(offset=5, limit=0))],
+        ],
+        [
+            [Limit(5), Limit(3), Offset(1), Offset(1)],
+            [_LimitOffset(dict(offset=2, limit=1))],
+        ],
+        [
+            [Offset(1), Order([]), Offset(1), Limit(1)],
+            [Offset(1), Order([]), _LimitOffset(dict(offset=1, limit=1))],
+        ],
+        [
+            [Order([]), Limit(1)],
+            [Order([]), Limit(1)],
+        ],
+    ]
+)
+def test_fuse_limits_and_offsets(transformations, expected_fused_transformations):
+    assert _fuse_transformations(transformations) == expected_fused_transformations
+
+
+def test_fused_limits_have_no_offset(books_relation):
+    fused_transform, = _fuse_transformations([Limit(5), Limit(3)])
+    sql = str(fused_transform.apply_to_relation_raw(books_relation).compile())
+    assert 'LIMIT' in sql
+    assert 'OFFSET' not in sql
+
+
+_summarize = Summarize(
+    dict(
+        base_grouping_column='author',
+        grouping_expressions=[
+            dict(input_alias='author', output_alias='author_grouped'),
+            dict(input_alias='published', output_alias='month_grouped', preproc='truncate_to_month'),
+        ],
+        aggregation_expressions=[
+            dict(input_alias='title', output_alias='title_agged', function='count'),
+        ],
+    )
+)
+
+
+def _equal_filter(column_name):
+    return Filter({'equal': [{'column_name': [column_name]}, {'literal': ['x']}]})
+
+
+_constant_filter = Filter({'equal': [{'literal': [1]}, {'literal': [2]}]})
+
+
+@pytest.mark.parametrize(
+    'transformations,expected_pushed_down_transformations',
+    [
+        [
+            [_summarize, _equal_filter('author_grouped')],
+            [_equal_filter('author'), _summarize],
+        ],
+        [
+            [HideColumns(['title']), _summarize, Order([]), _equal_filter('author_grouped')],
+            [HideColumns(['title']), _summarize, Order([]), _equal_filter('author_grouped')],
+        ],
+        [
+            [_summarize, HideColumns(['title_agged']), _equal_filter('author_grouped')],
+            [_equal_filter('author'), _summarize, HideColumns(['title_agged'])],
+        ],
+        [
+            [_summarize, _equal_filter('month_grouped')],
+            [_summarize, _equal_filter('month_grouped')],
+        ],
+        [
+            [_summarize, _equal_filter('title_agged')],
+            [_summarize, _equal_filter('title_agged')],
+        ],
+        [
+            [_summarize, _constant_filter],
+            [_summarize, _constant_filter],
+        ],
+        [
+            [HideColumns(['title']), _constant_filter],
+            [_constant_filter, HideColumns(['title'])],
+        ],
+        [
+            [Limit(5), _equal_filter('author')],
+            [Limit(5), _equal_filter('author')],
+        ],
+        [
+            [HideColumns(['author']), _equal_filter('author')],
+            [HideColumns(['author']), _equal_filter('author')],
+        ],
+    ]
+)
+def test_push_down_filters(transformations, expected_pushed_down_transformations):
+    assert _push_down_filters(transformations) == expected_pushed_down_transformations
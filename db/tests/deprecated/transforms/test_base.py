@@ -0,0 +1,27 @@
+import pytest
+
+from db.deprecated.transforms.base import Filter, Limit, Order
+
+
+@pytest.mark.parametrize(
+    'transform,equal_transform',
+    [
+        [Limit(1), Limit(True)],
+        [Limit(1), Limit(1.0)],
+        [
+            Order([{'field': 'id', 'direction': 'asc'}]),
+            Order([{'direction': 'asc', 'field': 'id'}]),
+        ],
+        [
+            Filter({'equal': [{'column_name': ['id']}, {'literal': [1]}]}),
+            Filter({'equal': [{'column_name': ['id']}, {'literal': [1.0]}]}),
+        ],
+    ]
+)
+def test_equal_transforms_hash_equally(transform, equal_transform):
+    assert transform == equal_transform
+    assert hash(transform) == hash(equal_transform)
+
+
+def test_transforms_with_unhashable_specs_hash():
+    assert hash(Limit(bytearray(b'1'))) == hash(Limit(bytearray(b'1')))
@@ -0,0 +1,28 @@
+from sqlalchemy import select
+
+from db.deprecated.transforms.base import Filter
+
+
+def _get_statement_cache_key(table, filter_spec):
+    # Table objects are part of statement cache keys by identity, so the same table is used for
+    # the statements being compared.
+    relation = Filter(filter_spec).apply_to_relation(select(table).cte())
+    return select(relation)._generate_cache_key()
+
+
+def _equal_title_spec(literal):
+    return {'equal': [{'column_name': ['title']}, {'literal': [literal]}]}
+
+
+def test_filters_differing_in_literals_share_cache_key(books_table):
+    assert (
+        _get_statement_cache_key(books_table, _equal_title_spec('Moby Dick'))
+        == _get_statement_cache_key(books_table, _equal_title_spec('Dracula'))
+    )
+
+
+def test_filters_differing_in_structure_dont_share_cache_key(books_table):
+    assert (
+        _get_statement_cache_key(books_table, _equal_title_spec('Moby Dick'))
+        != _get_statement_cache_key(books_table, {'null': [{'column_name': ['title']}]})
+    )
@@ -0,0 +1,25 @@
+from db.deprecated.transforms.base import HideColumns, SelectSubsetOfColumns
+
+
+def test_select_all_columns_returns_relation(books_relation):
+    all_columns = ['id', 'title', 'author']
+    assert SelectSubsetOfColumns(all_columns).apply_to_relation(books_relation) is books_relation
+
+
+def test_select_reordered_columns_selects(books_relation):
+    selected = SelectSubsetOfColumns(['title', 'id']).apply_to_relation(books_relation)
+    assert selected is not books_relation
+    assert list(selected.columns.keys()) == ['title', 'id']
+
+
+def test_hide_no_columns_returns_relation(books_relation):
+    assert HideColumns([]).apply_to_relation(books_relation) is books_relation
+
+
+def test_hide_columns_selects_the_rest(books_relation):
+    selected = HideColumns(['id']).apply_to_relation(books_relation)
+    assert list(selected.columns.keys()) == ['title', 'author']
+
+
+def test_hide_missing_columns_returns_relation(books_relation):
+    assert HideColumns(['publisher']).apply_to_relation(books_relation) is books_relation
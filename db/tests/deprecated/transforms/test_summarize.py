@@ -0,0 +1,84 @@
+from db.deprecated.transforms.base import Order, Summarize
+
+
+def _get_group_by_input_aliases(executable):
+    return [label.element.name for label in executable._group_by_clauses]
+
+
+def test_summarize_groups_by_primary_key_first(books_relation):
+    summarize = Summarize(
+        dict(
+            base_grouping_column='author',
+            grouping_expressions=[
+                dict(input_alias='author', output_alias='author_grouped'),
+                dict(input_alias='id', output_alias='id_grouped'),
+            ],
+            aggregation_expressions=[],
+        )
+    )
+    executable = summarize.apply_to_relation_raw(books_relation)
+    assert list(executable.selected_columns.keys()) == ['author_grouped', 'id_grouped']
+    assert _get_group_by_input_aliases(executable) == ['id', 'author']
+
+
+def test_summarize_groups_by_following_order_first(books_relation):
+    summarize = Summarize(
+        dict(
+            base_grouping_column='id',
+            grouping_expressions=[
+                dict(input_alias='id', output_alias='id_grouped'),
+                dict(input_alias='author', output_alias='author_grouped'),
+                dict(input_alias='title', output_alias='title_grouped'),
+            ],
+            aggregation_expressions=[],
+        )
+    )
+    order = Order([
+        {'field': 'title_grouped', 'direction': 'desc'},
+        {'field': 'author_grouped', 'direction': 'asc'},
+    ])
+    summarize = summarize.get_new_with_group_by_ordered_like(order)
+    executable = summarize.apply_to_relation_raw(books_relation)
+    assert (
+        list(executable.selected_columns.keys())
+        == ['id_grouped', 'author_grouped', 'title_grouped']
+    )
+    assert _get_group_by_input_aliases(executable) == ['title', 'author', 'id']
+
+
+def test_summarize_equality_survives_cached_properties():
+    spec = dict(
+        base_grouping_column='author',
+        grouping_expressions=[dict(input_alias='author', output_alias='author_grouped')],
+        aggregation_expressions=[],
+    )
+    summarize = Summarize(spec)
+    other_summarize = Summarize(spec)
+    summarize.map_of_output_alias_to_input_alias
+    summarize.grouping_output_aliases
+    assert summarize == other_summarize
+    assert hash(summarize) == hash(other_summarize)
+
+
+def test_summarize_group_by_prefix_is_part_of_identity():
+    summarize = Summarize(
+        dict(
+            base_grouping_column='id',
+            grouping_expressions=[
+                dict(input_alias='id', output_alias='id_grouped'),
+                dict(input_alias='author', output_alias='author_grouped'),
+            ],
+            aggregation_expressions=[],
+        )
+    )
+    reordered_summarize = summarize.get_new_with_group_by_ordered_like(
+        Order([{'field': 'author_grouped', 'direction': 'asc'}])
+    )
+    assert reordered_summarize != summarize
+    assert reordered_summarize == Summarize(summarize.spec, group_by_prefix=['author_grouped'])
+    assert (
+        hash(reordered_summarize)
+        == hash(Summarize(summarize.spec, group_by_prefix=['author_grouped']))
+    )
+    extended_summarize = reordered_summarize.get_new_with_aliases_added_to_agg_on(['title'])
+    assert extended_summarize._group_by_prefix == ('author_grouped',)